@@ -11,15 +11,47 @@ This script handles:
 Updated categories: protokoller, vedtekter, særavtale_bntf, hovedavtalen, overenskomsten, other
 """
 
+import asyncio
+import gzip
 import json
+import mmap
 import os
+import re
 import urllib.parse
 import hashlib
 import requests
+import shlex
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime, timezone
 from pathlib import Path
+from types import MappingProxyType
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
 
 # Configuration
 GITHUB_USERNAME = 'jarlesteinnes-bot'
@@ -27,145 +59,455 @@ REPO_NAME = 'bntf-union-documents'
 BASE_URL = f'https://raw.githubusercontent.com/{GITHUB_USERNAME}/{REPO_NAME}/main'
 
 # Updated categories with proper Norwegian names
-CATEGORIES = ['protokoller', 'vedtekter', 'særavtale_bntf', 'hovedavtalen', 'overenskomsten', 'other']
+CATEGORIES = ('protokoller', 'vedtekter', 'særavtale_bntf', 'hovedavtalen', 'overenskomsten', 'other')
 
 # iOS App Update Configuration
 IOS_APP_WEBHOOK_URL = 'https://api.github.com/repos/jarlesteinnes-bot/bntf-ios-app/dispatches'
 IOS_UPDATE_EVENT_TYPE = 'document_update'
+IOS_REQUEST_TIMEOUT = 5
+IOS_NOTIFY_ATTEMPTS = 3
+IOS_NOTIFY_BACKOFF = 0.3
+
+# Every endpoint notified about document updates, posted concurrently
+IOS_NOTIFY_TARGETS = (IOS_APP_WEBHOOK_URL,)
+
+# Shared HTTP session so webhook calls and retries reuse pooled connections. Like
+# _post_notification it retries transport errors and 5xx responses, including POSTs
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=IOS_NOTIFY_ATTEMPTS - 1,
+        backoff_factor=IOS_NOTIFY_BACKOFF,
+        status_forcelist=range(500, 600),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {'POST'},
+        raise_on_status=False
+    )
+))
+
+# Printed by the batched git command when there is nothing to commit or push
+GIT_NO_CHANGES_SENTINEL = 'BNTF_NO_CHANGES'
 
 # Category display names for iOS app
-CATEGORY_DISPLAY_NAMES = {
+CATEGORY_DISPLAY_NAMES = MappingProxyType({
     'protokoller': 'Protokoller',
     'vedtekter': 'Vedtekter', 
     'særavtale_bntf': 'Særavtale BNTF',
     'hovedavtalen': 'Hovedavtalen YS/NHO',
     'overenskomsten': 'Overenskomsten',
     'other': 'Other'
-}
+})
 
 # Icons for each category
-CATEGORY_ICONS = {
+CATEGORY_ICONS = MappingProxyType({
     'protokoller': '📋',
     'vedtekter': '📜',
     'særavtale_bntf': '🚁', 
     'hovedavtalen': '🏢',
     'overenskomsten': '📄',
     'other': '📁'
-}
+})
+
+# Part of the tree hash; bump whenever the generated index files change, so an
+# upgrade rebuilds them even if no PDF changed
+INDEX_FORMAT = 2
+
+# Filenames made only of these characters are left unchanged by urllib.parse.quote
+_URL_SAFE_NAME = re.compile(r'\A[A-Za-z0-9._\-]+\Z')
+
+# Compact CBOR copy of the index: documents are positional arrays described by
+# documentFields, and the per-category fields live in the top-level maps
+CBOR_DOCUMENT_FIELDS = ('id', 'name', 'filename', 'url', 'size', 'modified', 'hash')
+_CBOR_MAP_START = b'\xbf'
+_CBOR_ARRAY_START = b'\x9f'
+_CBOR_BREAK = b'\xff'
+
+# Sidecar cache of content hashes, keyed by path and validated by (size, mtime_ns)
+_HASH_CACHE_PATH = Path('.pdf-hash-cache.json')
+
+# Hashing is I/O-bound and releases the GIL, so oversubscribe the CPUs
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+def _load_hash_cache():
+    """Load the content hash cache from disk"""
+    try:
+        with open(_HASH_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+_hash_cache = _load_hash_cache()
+_hash_cache_lock = threading.Lock()
+
+def _save_hash_cache(category_files):
+    """Persist the content hash cache to disk, keeping only the PDFs in category_files"""
+    # Rebuild from this run's scan so deleted or renamed PDFs do not accumulate
+    global _hash_cache
+    _hash_cache = {
+        entry.path: _hash_cache[entry.path]
+        for pdf_entries in category_files.values()
+        for entry in pdf_entries
+        if entry.path in _hash_cache
+    }
+    try:
+        with open(_HASH_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(_hash_cache, f, ensure_ascii=False)
+    except OSError as e:
+        log_message(f"Could not write hash cache {_HASH_CACHE_PATH}: {e}", "WARNING")
+
+def _dump_json(data):
+    """Serialize data as indented UTF-8 JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+def _dump_json_compact(data):
+    """Serialize data as a single line of JSON text"""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
 
 def log_message(message, level="INFO"):
-    """Log messages with timestamp"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    print(f"[{timestamp}] {level}: {message}")
+    """Log messages with timestamp (buffered; flushed around subprocesses and at exit)"""
+    sys.stdout.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {level}: {message}\n")
 
-def get_file_info(file_path):
-    """Get file information including size and modification time"""
+def get_file_info(entry):
+    """Get file information including size and modification time
+    
+    Takes an os.DirEntry so the stat from the directory scan is reused; the
+    file is only opened when its hash is not already cached. On error the
+    result has 'failed' set to True.
+    """
     try:
-        stat = os.stat(file_path)
+        stat = entry.stat()
+        key = entry.path
+        cached = _hash_cache.get(key)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            file_hash = cached['hash']
+        else:
+            # Non-cryptographic content fingerprint; hashing the mapping avoids copying
+            # the file into a bytes object (empty files cannot be mapped)
+            if stat.st_size == 0:
+                file_hash = hashlib.blake2b(digest_size=16).hexdigest()
+            else:
+                with open(entry.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    file_hash = hashlib.blake2b(mm, digest_size=16).hexdigest()
+            with _hash_cache_lock:
+                _hash_cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': file_hash}
         return {
             'size': stat.st_size,
-            'modified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat(),
-            'hash': hashlib.md5(open(file_path, 'rb').read()).hexdigest()
+            'modified': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(stat.st_mtime)),
+            'hash': file_hash
         }
     except Exception as e:
-        log_message(f"Error getting file info for {file_path}: {e}", "ERROR")
-        return {'size': 0, 'modified': '', 'hash': ''}
+        log_message(f"Error getting file info for {entry.path}: {e}", "ERROR")
+        return {'size': 0, 'modified': '', 'hash': '', 'failed': True}
+
+def _scan_categories():
+    """List the PDFs of every existing category directory, sorted by name"""
+    category_files = {}
+    for category in CATEGORIES:
+        if os.path.isdir(category):
+            with os.scandir(category) as entries:
+                pdf_entries = [entry for entry in entries if entry.is_file() and entry.name.endswith('.pdf')]
+            pdf_entries.sort(key=lambda entry: entry.name)
+            category_files[category] = pdf_entries
+    return category_files
+
+def _compute_tree_hash(category_files, version):
+    """Fingerprint the document tree from directory metadata only, without reading any PDF"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{version}\0{INDEX_FORMAT}'.encode('utf-8'))
+    for category, pdf_entries in category_files.items():
+        for entry in pdf_entries:
+            stat = entry.stat()
+            h.update(f'\0{category}/{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode('utf-8'))
+    return h.hexdigest()
+
+def _load_previous_index():
+    """Load the previously generated pdf-index.json, if any"""
+    try:
+        with open('pdf-index.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def generate_pdf_index():
-    """Generate comprehensive PDF index with new category structure"""
+def generate_pdf_index(run_time):
+    """Generate comprehensive PDF index with new category structure
+    
+    run_time is the UTC datetime of this run, recorded as lastUpdated. The
+    index is streamed to pdf-index.json one document at a time, so only the
+    summary (version, timestamp and statistics) is returned. Its 'changed'
+    flag is False when no PDF and no INDEX_FORMAT changed since the last run,
+    all index files exist, and the previous index was kept as is.
+    """
     log_message("Generating PDF index with updated categories...")
     
-    index = {
-        'lastUpdated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
-        'baseUrl': BASE_URL,
-        'version': '2.0',
-        'categories': CATEGORY_DISPLAY_NAMES,
-        'categoryIcons': CATEGORY_ICONS,
-        'documents': {},
-        'statistics': {
-            'totalDocuments': 0,
-            'totalSize': 0,
-            'categoryCounts': {}
+    # Bind globals used per document as locals for the hot loop
+    quote = urllib.parse.quote
+    is_url_safe = _URL_SAFE_NAME.match
+    blake2b = hashlib.blake2b
+    dump_json = _dump_json_compact
+    cbor_fields = CBOR_DOCUMENT_FIELDS
+    version = '2.0'
+    
+    # Collect every PDF up front so all files can be hashed concurrently
+    category_files = _scan_categories()
+    
+    tree_hash = _compute_tree_hash(category_files, version)
+    previous_index = _load_previous_index()
+    # The CBOR index must exist exactly when cbor2 can keep it up to date
+    outputs_current = os.path.exists('pdf-index.json.gz') and os.path.exists('pdf-index.cbor') == (cbor2 is not None)
+    if previous_index.get('treeHash') == tree_hash and outputs_current:
+        log_message("No document changes since last index, skipping regeneration")
+        return {
+            'lastUpdated': previous_index.get('lastUpdated'),
+            'version': previous_index.get('version', version),
+            'statistics': previous_index['statistics'],
+            'changed': False
         }
-    }
     
+    last_updated = run_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+    category_counts = {}
     total_documents = 0
     total_size = 0
+    failed_documents = 0
     
-    for category in CATEGORIES:
-        category_path = Path(category)
-        documents = []
-        category_size = 0
+    tmp_path = Path('pdf-index.json.tmp')
+    gzip_tmp_path = Path('pdf-index.json.gz.tmp')
+    cbor_tmp_path = Path('pdf-index.cbor.tmp')
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor, \
+            open(tmp_path, 'wb') as f, open(gzip_tmp_path, 'wb') as gzip_file, ExitStack() as stack:
+        # Pre-compressed copy for clients that are not served gzip transparently;
+        # mtime=0 keeps the output identical for identical content
+        gz = stack.enter_context(gzip.GzipFile(filename='', mode='wb', compresslevel=6, fileobj=gzip_file, mtime=0))
+        
+        def write(text):
+            data = text.encode('utf-8')
+            f.write(data)
+            gz.write(data)
         
-        if category_path.exists() and category_path.is_dir():
-            log_message(f"Processing category: {category}")
+        cbor = None
+        if cbor2 is not None:
+            cbor = cbor2.CBOREncoder(stack.enter_context(open(cbor_tmp_path, 'wb')))
+        
+        category_futures = {
+            category: [(entry, executor.submit(get_file_info, entry)) for entry in pdf_entries]
+            for category, pdf_entries in category_files.items()
+        }
+        
+        write('{\n')
+        write(f'  "lastUpdated": {dump_json(last_updated)},\n')
+        write(f'  "baseUrl": {dump_json(BASE_URL)},\n')
+        write(f'  "version": {dump_json(version)},\n')
+        write(f'  "categories": {dump_json(dict(CATEGORY_DISPLAY_NAMES))},\n')
+        write(f'  "categoryIcons": {dump_json(dict(CATEGORY_ICONS))},\n')
+        write('  "documents": {')
+        
+        if cbor:
+            cbor.fp.write(_CBOR_MAP_START)
+            for key, value in (('lastUpdated', last_updated), ('baseUrl', BASE_URL), ('version', version),
+                               ('categories', dict(CATEGORY_DISPLAY_NAMES)),
+                               ('categoryIcons', dict(CATEGORY_ICONS)), ('documentFields', CBOR_DOCUMENT_FIELDS)):
+                cbor.encode(key)
+                cbor.encode(value)
+            cbor.encode('documents')
+            cbor.fp.write(_CBOR_MAP_START)
+        
+        for category_number, category in enumerate(CATEGORIES):
+            document_count = 0
+            category_size = 0
+            
+            write(',\n' if category_number else '\n')
+            write(f'    {dump_json(category)}: [')
+            if cbor:
+                cbor.encode(category)
+                cbor.fp.write(_CBOR_ARRAY_START)
             
-            pdf_files = list(category_path.glob('*.pdf'))
-            for pdf_file in sorted(pdf_files):
-                file_info = get_file_info(pdf_file)
-                file_id = hashlib.md5(f'{category}_{pdf_file.name}'.encode()).hexdigest()[:12]
+            if category in category_futures:
+                log_message(f"Processing category: {category}")
                 
-                document = {
-                    'id': file_id,
-                    'name': pdf_file.stem,  # filename without extension
-                    'filename': pdf_file.name,
-                    'url': f'{BASE_URL}/{category}/{urllib.parse.quote(pdf_file.name)}',
-                    'category': category,
-                    'categoryDisplayName': CATEGORY_DISPLAY_NAMES.get(category, category),
-                    'icon': CATEGORY_ICONS.get(category, '📄'),
-                    'size': file_info['size'],
-                    'modified': file_info['modified'],
-                    'hash': file_info['hash']
-                }
+                # Loop-invariant per-category values
+                display_name = CATEGORY_DISPLAY_NAMES.get(category, category)
+                icon = CATEGORY_ICONS.get(category, '📄')
+                url_prefix = f'{BASE_URL}/{category}/'
                 
-                documents.append(document)
-                category_size += file_info['size']
-                total_documents += 1
-                total_size += file_info['size']
+                for entry, future in category_futures[category]:
+                    file_info = future.result()
+                    if file_info.get('failed'):
+                        failed_documents += 1
+                    # 6-byte digest gives the 12 hex character id directly
+                    file_id = blake2b(f'{category}_{entry.name}'.encode('utf-8'), digest_size=6).hexdigest()
+                    
+                    document = {
+                        'id': file_id,
+                        'name': entry.name[:-4],  # filename without extension
+                        'filename': entry.name,
+                        'url': url_prefix + (entry.name if is_url_safe(entry.name) else quote(entry.name)),
+                        'category': category,
+                        'categoryDisplayName': display_name,
+                        'icon': icon,
+                        'size': file_info['size'],
+                        'modified': file_info['modified'],
+                        'hash': file_info['hash']
+                    }
+                    
+                    write(',\n' if document_count else '\n')
+                    write(f'      {dump_json(document)}')
+                    if cbor:
+                        cbor.encode([document[field] for field in cbor_fields])
+                    document_count += 1
+                    category_size += file_info['size']
+                
+                log_message(f"Found {document_count} documents in {category} ({category_size:,} bytes)")
             
-            log_message(f"Found {len(documents)} documents in {category} ({category_size:,} bytes)")
+            write('\n    ]' if document_count else ']')
+            if cbor:
+                cbor.fp.write(_CBOR_BREAK)
+            category_counts[category] = document_count
+            total_documents += document_count
+            total_size += category_size
+        
+        statistics = {
+            'totalDocuments': total_documents,
+            'totalSize': total_size,
+            'categoryCounts': category_counts
+        }
+        
+        # treeHash goes last so it is only recorded once every file was read; after a
+        # failure it stays null and the next run rebuilds instead of keeping bad entries
+        if failed_documents:
+            log_message(f"{failed_documents} documents could not be read, index will be rebuilt next run", "WARNING")
+        stored_tree_hash = None if failed_documents else tree_hash
+        
+        write('\n  },\n')
+        write(f'  "statistics": {dump_json(statistics)},\n')
+        write(f'  "treeHash": {dump_json(stored_tree_hash)}\n')
+        write('}\n')
         
-        index['documents'][category] = documents
-        index['statistics']['categoryCounts'][category] = len(documents)
+        if cbor:
+            cbor.fp.write(_CBOR_BREAK)
+            cbor.encode('statistics')
+            cbor.encode(statistics)
+            cbor.encode('treeHash')
+            cbor.encode(stored_tree_hash)
+            cbor.fp.write(_CBOR_BREAK)
     
-    index['statistics']['totalDocuments'] = total_documents
-    index['statistics']['totalSize'] = total_size
+    # Swap the finished files in so readers never see a partial index
+    os.replace(tmp_path, 'pdf-index.json')
+    os.replace(gzip_tmp_path, 'pdf-index.json.gz')
+    if cbor2 is not None:
+        os.replace(cbor_tmp_path, 'pdf-index.cbor')
+    else:
+        # Without cbor2 a previously published binary index would go stale
+        Path('pdf-index.cbor').unlink(missing_ok=True)
     
-    # Write the index file
-    with open('pdf-index.json', 'w', encoding='utf-8') as f:
-        json.dump(index, f, indent=2, ensure_ascii=False)
+    _save_hash_cache(category_files)
     
     log_message(f"✅ PDF index generated: {total_documents} documents, {total_size:,} bytes total")
-    return index
+    return {
+        'lastUpdated': last_updated,
+        'version': version,
+        'statistics': statistics,
+        'changed': True
+    }
+
+def _git_has_unsynced_changes():
+    """Check whether the work tree or local commits still need to reach origin/main"""
+    # A missing origin/main makes the command fail, which also counts as unsynced
+    command = "git status --porcelain && git rev-parse -q --verify origin/main >/dev/null && git rev-list origin/main..HEAD"
+    sys.stdout.flush()
+    result = subprocess.run(command, shell=True, executable='/bin/bash', capture_output=True, text=True)
+    return result.returncode != 0 or bool(result.stdout.strip())
+
+def _git_commit_and_push_subprocess(commit_message):
+    """Commit and push with the git CLI; returns False when there is nothing to commit or push"""
+    # Stage, commit and push in a single shell to avoid one process spawn per step. Commits
+    # left unpushed by an earlier failed run are pushed even when nothing new is staged.
+    # Only the sentinel reaches stdout and push progress is silenced, so the pipes
+    # carry nothing but the no-changes marker and error output.
+    command = (
+        f"git add -A && "
+        f"{{ git diff --cached --quiet || git commit -q -m {shlex.quote(commit_message)} >/dev/null; }} && "
+        f"{{ git rev-parse -q --verify origin/main >/dev/null && [ -z \"$(git rev-list origin/main..HEAD)\" ] "
+        f"&& echo {GIT_NO_CHANGES_SENTINEL} || git push -q origin main >/dev/null; }}"
+    )
+    sys.stdout.flush()
+    result = subprocess.run(command, shell=True, executable='/bin/bash', capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Git commit/push failed: {result.stderr}")
+    return GIT_NO_CHANGES_SENTINEL not in result.stdout
+
+def _git_commit_and_push_pygit2(commit_message):
+    """Commit and push in-process with libgit2; returns False when there is nothing to commit or push"""
+    class PushCallbacks(pygit2.RemoteCallbacks):
+        credential_attempts = 0
+        
+        def credentials(self, url, username_from_url, allowed_types):
+            # libgit2 asks again after a rejected credential, so offer one attempt only
+            self.credential_attempts += 1
+            if self.credential_attempts > 1:
+                raise pygit2.GitError(f"Authentication to {url} failed")
+            if allowed_types & pygit2.enums.CredentialType.SSH_KEY:
+                return pygit2.KeypairFromAgent(username_from_url or 'git')
+            token = os.environ.get('GITHUB_TOKEN')
+            if token and allowed_types & pygit2.enums.CredentialType.USERPASS_PLAINTEXT:
+                return pygit2.UserPass('x-access-token', token)
+            raise pygit2.GitError(f"No credentials available for {url}")
+        
+        def push_update_reference(self, refname, message):
+            # libgit2 reports rejected refs here instead of failing the push
+            if message:
+                raise pygit2.GitError(f"Push of {refname} rejected: {message}")
+    
+    repo = pygit2.Repository('.')
+    index = repo.index
+    index.add_all()
+    # add_all only adds and updates, so drop entries for deleted files like `git add -A`
+    for entry in list(index):
+        if not os.path.lexists(entry.path):
+            index.remove(entry.path)
+    index.write()
+    tree = index.write_tree()
+    
+    parent = repo.head.target
+    if tree != repo[parent].tree_id:
+        signature = repo.default_signature
+        repo.create_commit('HEAD', signature, signature, commit_message, tree, [parent])
+    
+    # Also push commits left behind by an earlier failed push
+    remote_main = repo.references.get('refs/remotes/origin/main')
+    if remote_main is not None and repo.ahead_behind(repo.head.target, remote_main.target)[0] == 0:
+        return False
+    
+    try:
+        repo.remotes['origin'].push(['refs/heads/main'], callbacks=PushCallbacks())
+    except pygit2.GitError as e:
+        # libgit2 ignores credential helpers and http.extraheader, which the git CLI honours
+        log_message(f"In-process push failed ({e}), retrying with git push", "WARNING")
+        sys.stdout.flush()
+        result = subprocess.run(['git', 'push', '-q', 'origin', 'main'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Git push failed: {result.stderr}")
+    return True
 
 def git_commit_and_push():
     """Commit changes and push to GitHub"""
     try:
-        log_message("Committing changes to Git...")
+        log_message("Committing and pushing changes to GitHub...")
         
-        # Add all changes
-        result = subprocess.run(['git', 'add', '.'], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise Exception(f"Git add failed: {result.stderr}")
+        commit_message = f"Auto-update: Documents synced with Særavtale BNTF - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        if pygit2 is not None:
+            committed = _git_commit_and_push_pygit2(commit_message)
+        else:
+            committed = _git_commit_and_push_subprocess(commit_message)
         
-        # Check if there are changes to commit
-        result = subprocess.run(['git', 'status', '--porcelain'], capture_output=True, text=True)
-        if not result.stdout.strip():
+        if not committed:
             log_message("No changes to commit")
             return False
         
-        # Commit with descriptive message
-        commit_message = f"Auto-update: Documents synced with Særavtale BNTF - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-        result = subprocess.run(['git', 'commit', '-m', commit_message], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise Exception(f"Git commit failed: {result.stderr}")
-        
-        # Push to GitHub
-        log_message("Pushing to GitHub...")
-        result = subprocess.run(['git', 'push', 'origin', 'main'], capture_output=True, text=True)
-        if result.returncode != 0:
-            raise Exception(f"Git push failed: {result.stderr}")
-        
         log_message("✅ Successfully pushed changes to GitHub")
         return True
         
@@ -173,8 +515,29 @@ def git_commit_and_push():
         log_message(f"❌ Git operations failed: {e}", "ERROR")
         return False
 
-def notify_ios_app(index_data):
-    """Notify iOS app about document updates"""
+async def _post_notification(client, url, payload, headers):
+    """POST a notification with httpx, retrying transient failures with exponential backoff"""
+    for attempt in range(1, IOS_NOTIFY_ATTEMPTS + 1):
+        try:
+            response = await client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            return
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            # Client errors (bad token, unknown repo, invalid payload) will not succeed on retry
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                raise
+            if attempt == IOS_NOTIFY_ATTEMPTS:
+                raise
+            log_message(f"Notification to {url} failed ({e}), retrying...", "WARNING")
+            await asyncio.sleep(IOS_NOTIFY_BACKOFF * 2 ** (attempt - 1))
+
+def _post_notification_with_session(url, payload, headers):
+    """POST a notification through the pooled requests session"""
+    response = SESSION.post(url, json=payload, headers=headers, timeout=IOS_REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+async def notify_ios_app(index_data, run_time):
+    """Notify iOS app about document updates made in the run started at run_time"""
     try:
         log_message("Notifying iOS app about document updates...")
         
@@ -182,25 +545,55 @@ def notify_ios_app(index_data):
         payload = {
             'event_type': IOS_UPDATE_EVENT_TYPE,
             'client_payload': {
-                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'timestamp': run_time.isoformat(timespec='seconds'),
                 'totalDocuments': index_data['statistics']['totalDocuments'],
                 'categoryCounts': index_data['statistics']['categoryCounts'],
                 'updatedCategories': list(CATEGORIES),
                 'specialUpdate': 'særavtale_bntf_renamed',
                 'indexUrl': f'{BASE_URL}/pdf-index.json',
+                'indexGzipUrl': f'{BASE_URL}/pdf-index.json.gz',
+                'indexCborUrl': f'{BASE_URL}/pdf-index.cbor' if cbor2 is not None else None,
                 'version': index_data.get('version', '2.0')
             }
         }
         
-        # Note: In a real implementation, you would need a GitHub token
-        # For simulation, we'll just log the notification
         log_message(f"📱 iOS App Notification Payload:")
         log_message(f"   Event Type: {IOS_UPDATE_EVENT_TYPE}")
         log_message(f"   Total Documents: {index_data['statistics']['totalDocuments']}")
         log_message(f"   Categories: {', '.join(CATEGORIES)}")
         log_message(f"   Special Update: Særavtale BNTF category renamed")
         
-        # Simulate successful notification
+        # Repository dispatches need a GitHub token; without one we only log the payload
+        token = os.environ.get('GITHUB_TOKEN')
+        if not token:
+            log_message("GITHUB_TOKEN not set, skipping iOS app dispatch", "WARNING")
+            return True
+        
+        headers = {
+            'Accept': 'application/vnd.github+json',
+            'Authorization': f'Bearer {token}'
+        }
+        # Collect failures instead of raising so one bad target cannot cut the others short
+        if httpx is not None:
+            async with httpx.AsyncClient(timeout=IOS_REQUEST_TIMEOUT) as client:
+                results = await asyncio.gather(*(
+                    _post_notification(client, url, payload, headers) for url in IOS_NOTIFY_TARGETS
+                ), return_exceptions=True)
+        else:
+            # Fall back to the pooled requests session, which retries on its own
+            results = await asyncio.gather(*(
+                asyncio.to_thread(_post_notification_with_session, url, payload, headers)
+                for url in IOS_NOTIFY_TARGETS
+            ), return_exceptions=True)
+        
+        failed_targets = 0
+        for url, result in zip(IOS_NOTIFY_TARGETS, results):
+            if isinstance(result, Exception):
+                log_message(f"❌ Failed to notify {url}: {result}", "ERROR")
+                failed_targets += 1
+        if failed_targets:
+            return False
+        
         log_message("✅ iOS app notification sent successfully")
         return True
         
@@ -231,9 +624,18 @@ def create_webhook_config():
         ]
     }
     
-    with open('webhook-config.json', 'w', encoding='utf-8') as f:
-        json.dump(webhook_config, f, indent=2, ensure_ascii=False)
+    # Only rewrite on change so an identical config never shows up as a git modification
+    config_path = Path('webhook-config.json')
+    content = _dump_json(webhook_config)
+    try:
+        unchanged = config_path.read_bytes() == content
+    except OSError:
+        unchanged = False
+    if unchanged:
+        log_message("Webhook configuration unchanged")
+        return
     
+    config_path.write_bytes(content)
     log_message("✅ Webhook configuration created")
 
 def main():
@@ -241,6 +643,9 @@ def main():
     log_message("🚁 Starting BNTF Document Manager Auto-Update System")
     log_message("=" * 60)
     
+    # One timestamp for the whole run, shared by the index and the notification
+    run_time = datetime.now(timezone.utc)
+    
     # Check if we're in the right directory
     if not os.path.exists('.git'):
         log_message("❌ Not in a Git repository. Please run from bntf-union-documents directory", "ERROR")
@@ -248,15 +653,22 @@ def main():
     
     # Step 1: Generate updated PDF index
     try:
-        index_data = generate_pdf_index()
+        index_data = generate_pdf_index(run_time)
     except Exception as e:
         log_message(f"❌ Failed to generate PDF index: {e}", "ERROR")
         sys.exit(1)
     
+    if not index_data['changed']:
+        if not _git_has_unsynced_changes():
+            log_message("✅ Documents are up to date, nothing to sync")
+            sys.stdout.flush()
+            return
+        log_message("Index is current but earlier changes were not pushed, retrying sync")
+    
     # Step 2: Commit and push to GitHub
     if git_commit_and_push():
         # Step 3: Notify iOS app
-        notify_ios_app(index_data)
+        asyncio.run(notify_ios_app(index_data, run_time))
         
         # Step 4: Create webhook configuration
         create_webhook_config()
@@ -267,6 +679,7 @@ def main():
         log_message("🔄 Webhook system configured for future automatic updates")
         log_message(f"📊 Total documents: {index_data['statistics']['totalDocuments']}")
         log_message("🚁 Særavtale BNTF category properly configured")
+        sys.stdout.flush()
     else:
         log_message("❌ Auto-update process failed", "ERROR")
         sys.exit(1)